@@ -1,14 +1,27 @@
+import ctypes
 import gc
 import json
+import math
+import os
+import signal
+import socket
+import socketserver
+import struct
 import sys
+import tempfile
 import time
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass, field
+from functools import cache, lru_cache
 from pathlib import Path
+from typing import TextIO
 
+import numpy as np
 import pypdfium2 as pdfium
 import pypdfium2.raw as pdfium_c
-from PIL import Image, ImageChops, ImageOps
+from PIL import Image
 
 
 def _get_arg(flag: str, default: str) -> str:
@@ -24,6 +37,7 @@ DATA_FILE = Path(_get_arg('--classification', 'data/classification.json'))
 OUTPUT_BASE = Path(_get_arg('--output-base', 'output/ocr-raw'))
 STATUS_FILE = Path(_get_arg('--status-file', 'output/ocr-progress.json'))
 LOG_FILE = Path(_get_arg('--log-file', 'output/ocr-log.txt'))
+SOCKET_PATH = Path(_get_arg('--socket', str(Path(tempfile.gettempdir()) / f'anymd-ocr-{os.getuid()}.sock')))
 
 MODEL_ID = 'mlx-community/chandra-4bit'
 IMAGE_DPI = 150
@@ -31,11 +45,20 @@ MAX_TOKENS = 8192
 CROP_PADDING = 20
 CROP_THRESHOLD = 10
 VISION_MAX_PIXELS = 300_000
+VISION_MIN_PIXELS = VISION_MAX_PIXELS // 4
+RENDER_PREFETCH = 4
+VLM_BATCH_SIZE = 4
+WRITE_BUFFER = 1 << 20
 
 DIACRITICS = frozenset(
   'àáảãạăắằẳẵặâấầẩẫậèéẻẽẹêếềểễệìíỉĩịòóỏõọôốồổỗộơớờởỡợùúủũụưứừửữựỳýỷỹỵđ'
   'ÀÁẢÃẠĂẮẰẲẴẶÂẤẦẨẪẬÈÉẺẼẸÊẾỀỂỄỆÌÍỈĨỊÒÓỎÕỌÔỐỒỔỖỘƠỚỜỞỠỢÙÚỦŨỤƯỨỪỬỮỰỲÝỶỸỴĐ'
 )
+_DIACRITICS_ARR = np.array(sorted(ord(c) for c in DIACRITICS), dtype=np.uint32)
+_BMP_SIZE = 0x10000
+_IS_ALPHA = np.array([chr(i).isalpha() for i in range(_BMP_SIZE)], dtype=np.bool_)
+_DIAC_TRANS = str.maketrans('', '', ''.join(DIACRITICS))
+_VECTORIZE_MIN_CHARS = 512
 MIN_DIACRITICS_RATIO = 0.15
 MIN_CHARS_FOR_PAGE = 50
 
@@ -80,7 +103,22 @@ class Progress:
   recent_files: list[dict[str, object]] = field(default_factory=list)
 
 
-def _save_progress(p: Progress) -> None:
+PROGRESS_INTERVAL = 0.5
+
+
+@dataclass
+class ProgressClock:
+  written_at: float = 0.0
+
+
+_progress_clock = ProgressClock()
+
+
+def _save_progress(p: Progress, *, throttle: bool = False) -> None:
+  now = time.monotonic()
+  if throttle and now - _progress_clock.written_at < PROGRESS_INTERVAL:
+    return
+  _progress_clock.written_at = now
   remaining = p.total - p.done
   eta_seconds = remaining * p.avg_per_file if p.avg_per_file > 0 else 0
 
@@ -101,37 +139,35 @@ def _save_progress(p: Progress) -> None:
     'recent_files': p.recent_files[-10:],
   }
 
-  STATUS_FILE.write_text(json.dumps(progress, indent=2) + '\n', encoding='utf-8')
+  tmp_path = STATUS_FILE.with_name(f'{STATUS_FILE.name}.tmp')
+  tmp_path.write_text(json.dumps(progress, separators=(',', ':')) + '\n', encoding='utf-8')
+  tmp_path.replace(STATUS_FILE)
 
 
 def _free_memory() -> None:
   gc.collect()
 
 
-def _flatten_page(page: object) -> None:
-  pdfium_c.FPDFPage_Flatten(page, pdfium_c.FLAT_NORMALDISPLAY)
+def _flatten_page(page: object) -> bool:
+  return pdfium_c.FPDFPage_Flatten(page, pdfium_c.FLAT_NORMALDISPLAY) == pdfium_c.FLATTEN_SUCCESS
 
 
 NATIVE_TEXT_THRESHOLD = 50
+NATIVE_TEXT_PROBE = 200
 
 
-def _crop_margins(img: Image.Image) -> Image.Image:
-  bg = Image.new('RGB', img.size, (255, 255, 255))
-  diff = ImageChops.difference(img, bg)
-  gray = ImageOps.grayscale(diff)
-  bbox = gray.point(lambda x: 255 if x > CROP_THRESHOLD else 0).getbbox()
-  bg.close()
-  diff.close()
-  gray.close()
-  if not bbox:
-    return img
-  x0 = max(0, bbox[0] - CROP_PADDING)
-  y0 = max(0, bbox[1] - CROP_PADDING)
-  x1 = min(img.size[0], bbox[2] + CROP_PADDING)
-  y1 = min(img.size[1], bbox[3] + CROP_PADDING)
-  cropped = img.crop((x0, y0, x1, y1))
-  img.close()
-  return cropped
+def _crop_margins(pixels: np.ndarray) -> np.ndarray:
+  mask = pixels < 255 - CROP_THRESHOLD
+  xs = np.flatnonzero(mask.any(axis=0))
+  if xs.size == 0:
+    return pixels
+  ys = np.flatnonzero(mask.any(axis=1))
+  height, width = pixels.shape
+  x0 = max(0, int(xs[0]) - CROP_PADDING)
+  y0 = max(0, int(ys[0]) - CROP_PADDING)
+  x1 = min(width, int(xs[-1]) + 1 + CROP_PADDING)
+  y1 = min(height, int(ys[-1]) + 1 + CROP_PADDING)
+  return pixels[y0:y1, x0:x1]
 
 
 def _tesseract_ocr(image: Image.Image) -> str:
@@ -140,31 +176,136 @@ def _tesseract_ocr(image: Image.Image) -> str:
   return pytesseract.image_to_string(image, lang='vie')
 
 
+def _codepoints(text: str) -> np.ndarray:
+  return np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+
+
+def _count_alpha(codes: np.ndarray) -> int:
+  bmp = codes < _BMP_SIZE
+  count = int(np.count_nonzero(_IS_ALPHA[codes[bmp]]))
+  if not bmp.all():
+    count += sum(chr(c).isalpha() for c in codes[~bmp].tolist())
+  return count
+
+
 def _tesseract_quality_ok(text: str) -> bool:
-  alpha_count = sum(1 for c in text if c.isalpha())
+  if len(text) < _VECTORIZE_MIN_CHARS:
+    alpha_count = sum(map(str.isalpha, text))
+    diacritics_count = len(text) - len(text.translate(_DIAC_TRANS))
+  else:
+    codes = _codepoints(text)
+    alpha_count = _count_alpha(codes)
+    diacritics_count = int(np.count_nonzero(np.isin(codes, _DIACRITICS_ARR)))
   if alpha_count < MIN_CHARS_FOR_PAGE:
     return False
-  diacritics_count = 0
-  for ch in text:
-    if ch in DIACRITICS:
-      diacritics_count += 1
   return diacritics_count / alpha_count >= MIN_DIACRITICS_RATIO
 
 
-def _render_page(doc: pdfium.PdfDocument, page_idx: int) -> tuple[Image.Image | None, str]:
-  page_obj = doc[page_idx]
-  text = page_obj.get_textpage().get_text_range()
-  alpha_count = sum(1 for c in text if c.isalpha())
+def _get_max_workers() -> int:
+  return max(1, min(RENDER_PREFETCH, (os.cpu_count() or 2) - 1))
+
+
+@cache
+def _render_pool() -> ProcessPoolExecutor:
+  return ProcessPoolExecutor(max_workers=_get_max_workers())
+
+
+def _reset_render_pool() -> None:
+  _render_pool().shutdown(cancel_futures=True)
+  _render_pool.cache_clear()
+
+
+OCR_THREADS = min(4, os.cpu_count() or 1)
+PIPELINE_DEPTH = RENDER_PREFETCH + OCR_THREADS
+_OCR_POOL = ThreadPoolExecutor(max_workers=OCR_THREADS)
+
+
+_worker_docs: dict[str, pdfium.PdfDocument] = {}
+
+
+def _open_doc(pdf: str) -> pdfium.PdfDocument:
+  if pdf not in _worker_docs:
+    for stale in _worker_docs.values():
+      stale.close()
+    _worker_docs.clear()
+    doc = pdfium.PdfDocument(pdf)
+    doc.init_forms()
+    _worker_docs[pdf] = doc
+  return _worker_docs[pdf]
+
+
+def _has_native_text(text: str) -> bool:
+  alpha_count = 0
+  for c in text:
+    if c.isalpha():
+      alpha_count += 1
+      if alpha_count >= NATIVE_TEXT_THRESHOLD:
+        return True
+  return False
+
+
+def _native_text(page_obj: pdfium.PdfPage) -> str | None:
+  textpage = page_obj.get_textpage()
+  try:
+    n_chars = textpage.count_chars()
+    probe = textpage.get_text_range(count=min(n_chars, NATIVE_TEXT_PROBE))
+    if n_chars <= NATIVE_TEXT_PROBE:
+      text = probe
+    elif _has_native_text(probe):
+      return textpage.get_text_range().strip()
+    else:
+      text = textpage.get_text_range()
+    return text.strip() if _has_native_text(text) else None
+  finally:
+    textpage.close()
+
+
+_scratch_buffers: list[ctypes.Array[ctypes.c_ubyte]] = []
+_BYTES_PER_PIXEL = {
+  pdfium_c.FPDFBitmap_Gray: 1,
+  pdfium_c.FPDFBitmap_BGR: 3,
+  pdfium_c.FPDFBitmap_BGRx: 4,
+  pdfium_c.FPDFBitmap_BGRA: 4,
+}
 
-  if alpha_count >= NATIVE_TEXT_THRESHOLD:
-    return None, text.strip()
 
-  min_dim = min(page_obj.get_width(), page_obj.get_height())
-  scale_dpi = max((768 / min_dim) * 72, IMAGE_DPI)
-  _flatten_page(page_obj)
+def _scratch_bitmap(width: int, height: int, *, format: int, rev_byteorder: bool) -> pdfium.PdfBitmap:  # noqa: A002
+  size = width * height * _BYTES_PER_PIXEL[format]
+  if not _scratch_buffers or len(_scratch_buffers[0]) < size:
+    _scratch_buffers[:] = [(ctypes.c_ubyte * size)()]
+  return pdfium.PdfBitmap.new_native(width, height, format, rev_byteorder, buffer=_scratch_buffers[0])
+
+
+def _render_page(pdf: str, page_idx: int) -> tuple[bytes, int, int, str]:
+  doc = _open_doc(pdf)
   page_obj = doc[page_idx]
-  pil_image: Image.Image = page_obj.render(scale=scale_dpi / 72).to_pil().convert('RGB')
-  return _crop_margins(pil_image), ''
+  try:
+    native_text = _native_text(page_obj)
+    if native_text is not None:
+      return b'', 0, 0, native_text
+
+    min_dim = min(page_obj.get_width(), page_obj.get_height())
+    scale_dpi = max((768 / min_dim) * 72, IMAGE_DPI)
+    if _flatten_page(page_obj):
+      page_obj.close()
+      page_obj = doc[page_idx]
+    bitmap = page_obj.render(scale=scale_dpi / 72, grayscale=True, bitmap_maker=_scratch_bitmap)
+    try:
+      cropped = _crop_margins(bitmap.to_numpy())
+      height, width = cropped.shape
+      return cropped.tobytes(), width, height, ''
+    finally:
+      bitmap.close()
+  finally:
+    page_obj.close()
+
+
+def _page_count(pdf: str) -> int:
+  doc = pdfium.PdfDocument(pdf)
+  try:
+    return len(doc)
+  finally:
+    doc.close()
 
 
 def _chandra_ocr(
@@ -187,31 +328,52 @@ def _chandra_ocr(
   return result.text
 
 
-@dataclass
+def _chandra_ocr_batch(
+  model: object,
+  processor: object,
+  formatted_prompt: str,
+  images: list[Image.Image],
+) -> list[str]:
+  if len(images) == 1:
+    return [_chandra_ocr(model, processor, formatted_prompt, images[0])]
+  from mlx_vlm import batch_generate  # noqa: PLC0415
+
+  result = batch_generate(
+    model,  # type: ignore[arg-type]
+    processor,  # type: ignore[arg-type]
+    images=images,  # type: ignore[arg-type]
+    prompts=[OCR_PROMPT] * len(images),
+    max_tokens=MAX_TOKENS,
+    temperature=0.0,
+    verbose=False,
+  )
+  return list(result.texts)
+
+
+@dataclass(frozen=True)
 class ChandraState:
-  model: object = None
-  processor: object = None
-  formatted_prompt: str = ''
-  loaded: bool = False
+  model: object
+  processor: object
+  formatted_prompt: str
+  patch_factor: int
 
 
-def _load_chandra(state: ChandraState) -> None:
-  if state.loaded:
-    return
-  _log(f'Loading MLX model {MODEL_ID}...')
+@lru_cache(maxsize=1)
+def _load_chandra(model_id: str) -> ChandraState:
+  _log(f'Loading MLX model {model_id}...')
   t0 = time.time()
   from mlx_vlm import load  # noqa: PLC0415
   from mlx_vlm.prompt_utils import apply_chat_template  # noqa: PLC0415
   from mlx_vlm.utils import load_config  # noqa: PLC0415
 
-  state.model, state.processor = load(MODEL_ID)
-  config = load_config(MODEL_ID)
-  state.formatted_prompt = apply_chat_template(state.processor, config, OCR_PROMPT, num_images=1)
-  ip = state.processor.image_processor
-  ip.max_pixels = VISION_MAX_PIXELS
-  ip.min_pixels = VISION_MAX_PIXELS // 4
-  state.loaded = True
+  model, processor = load(model_id)
+  config = load_config(model_id)
+  formatted_prompt = apply_chat_template(processor, config, OCR_PROMPT, num_images=1)
+  ip = processor.image_processor
+  ip.do_resize = False
+  patch_factor = getattr(ip, 'patch_size', 14) * getattr(ip, 'merge_size', 2)
   _log(f'Model loaded in {time.time() - t0:.0f}s')
+  return ChandraState(model, processor, formatted_prompt, patch_factor)
 
 
 @dataclass
@@ -221,111 +383,324 @@ class PageCounts:
   txt: int = 0
 
 
-def _ocr_one_file(  # noqa: PLR0913, PLR0915, PLR0917
-  pdf: str,
-  chandra: ChandraState,
+@dataclass
+class PageBuffer:
+  num_pages: int
+  ready: dict[int, tuple[str, str, float]] = field(default_factory=dict)
+  vlm_queue: list[tuple[int, Image.Image, float]] = field(default_factory=list)
+  next_write: int = 0
+
+
+def _fit_vlm_budget(image: Image.Image, patch_factor: int) -> Image.Image:
+  area = image.width * image.height
+  scale = math.sqrt(min(max(area, VISION_MIN_PIXELS), VISION_MAX_PIXELS) / area)
+  snap = math.ceil if area < VISION_MIN_PIXELS else math.floor
+  size = (
+    max(patch_factor, snap(image.width * scale / patch_factor) * patch_factor),
+    max(patch_factor, snap(image.height * scale / patch_factor) * patch_factor),
+  )
+  if size != image.size:
+    resized = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    image.close()
+    image = resized
+  rgb = image.convert('RGB')
+  image.close()
+  return rgb
+
+
+def _triage_page(render: Future[tuple[bytes, int, int, str]]) -> tuple[Image.Image | None, str, str]:
+  data, width, height, native_text = render.result()
+  if not data:
+    return None, native_text, 'txt'
+  image = Image.frombuffer('L', (width, height), data, 'raw', 'L', 0, 1)
+  tess_text = _tesseract_ocr(image)
+  if _tesseract_quality_ok(tess_text):
+    image.close()
+    return None, tess_text, 'tess'
+  return image, '', 'vlm'
+
+
+def _queue_page(
+  buf: PageBuffer,
   counts: PageCounts,
-  done_count: int,
-  idx: int,
-  pending_len: int,
-  total: int,
-  errors: int,
-  avg: float,
-  pipeline_start: float,
-  recent_files: list[dict[str, object]],
-) -> int:
-  unique_name = _to_output_name(pdf)
+  p_idx: int,
+  triaged: tuple[Image.Image | None, str, str],
+  started: float,
+) -> None:
+  image, md, tag = triaged
+  if image is not None:
+    buf.vlm_queue.append((p_idx, image, started))
+    return
+  if tag == 'tess':
+    counts.tess += 1
+  else:
+    counts.txt += 1
+  buf.ready[p_idx] = (md, tag, time.time() - started)
+
+
+def _flush_vlm(buf: PageBuffer, counts: PageCounts) -> None:
+  chandra = _load_chandra(MODEL_ID)
+  images = [_fit_vlm_budget(image, chandra.patch_factor) for _, image, _ in buf.vlm_queue]
+  texts = _chandra_ocr_batch(chandra.model, chandra.processor, chandra.formatted_prompt, images)
+  for (p_idx, _, started), image, md in zip(buf.vlm_queue, images, texts, strict=True):
+    image.close()
+    counts.vlm += 1
+    buf.ready[p_idx] = (md, 'vlm', time.time() - started)
+  buf.vlm_queue.clear()
+
+
+def _write_ready(buf: PageBuffer, out: TextIO) -> None:
+  while buf.next_write in buf.ready:
+    md, tag, seconds = buf.ready.pop(buf.next_write)
+    if buf.next_write > 0:
+      out.write('\n\n')
+    out.write(md)
+    buf.next_write += 1
+    _log(f'  p{buf.next_write}/{buf.num_pages} [{tag}] {seconds:.0f}s ({len(md)} chars)')
+
+
+@dataclass
+class RunState:
+  total: int
+  done: int
+  pending: int
+  pipeline_start: float
+  started: int = 0
+  errors: int = 0
+  counts: PageCounts = field(default_factory=PageCounts)
+  file_times: list[float] = field(default_factory=list)
+  recent_files: list[dict[str, object]] = field(default_factory=list)
+
+
+def _avg_per_file(state: RunState) -> float:
+  return sum(state.file_times) / len(state.file_times) if state.file_times else 60
+
+
+def _record_file(state: RunState, pdf: str, num_pages: int, elapsed: float) -> None:
+  state.done += 1
+  state.file_times.append(elapsed)
+  avg = _avg_per_file(state)
+  state.recent_files.append({
+    'name': Path(pdf).stem,
+    'pages': num_pages,
+    'duration': round(elapsed, 1),
+    'per_page': round(elapsed / max(num_pages, 1), 1),
+  })
+  _log(f'  done {Path(pdf).stem} {elapsed:.0f}s ({elapsed / max(num_pages, 1):.0f}s/p) avg={avg:.0f}s/file')
+  _save_progress(
+    Progress(
+      state.done,
+      state.total,
+      state.errors,
+      '-',
+      '-',
+      0,
+      0,
+      time.time() - state.pipeline_start,
+      avg,
+      state.recent_files,
+    )
+  )
+
+
+def _record_error(state: RunState, pdf: str, ocr_err: BaseException) -> None:
+  state.errors += 1
+  _log(f'  ERROR {Path(pdf).stem}: {ocr_err}')
+  _free_memory()
+
+
+def _ocr_one_file(pdf: str, unique_name: str, state: RunState, head: list[str]) -> int:
   display_name = Path(pdf).stem
   file_start = time.time()
   md_path = OUTPUT_BASE / f'{unique_name}.md'
   tmp_path = OUTPUT_BASE / f'{unique_name}.md.tmp'
-  doc = pdfium.PdfDocument(pdf)
+  pages: deque[Future[tuple[Image.Image | None, str, str]]] = deque()
+  num_pages = _page_count(pdf)
+  start = len(head)
+  buf = PageBuffer(num_pages, next_write=start)
+  counts = state.counts
   try:
-    doc.init_forms()
-    num_pages = len(doc)
-    _log(f'[{idx}/{pending_len}] ({done_count + idx}/{total}) OCR {display_name} ({num_pages}p)')
-
-    executor = ThreadPoolExecutor(max_workers=1)
-    with tmp_path.open('w', encoding='utf-8') as out:
-      next_future = executor.submit(_render_page, doc, 0)
+    state.started += 1
+    _log(f'[{state.started}/{state.pending}] ({state.done + 1}/{state.total}) OCR {display_name} ({num_pages}p)')
+
+    pool = _render_pool()
+    next_submit = start
+    with tmp_path.open('w', encoding='utf-8', buffering=WRITE_BUFFER) as out:
+      out.write('\n\n'.join(head))
+      for p_idx in range(start, num_pages):
+        while next_submit < num_pages and len(pages) < PIPELINE_DEPTH:
+          render = pool.submit(_render_page, pdf, next_submit)
+          pages.append(_OCR_POOL.submit(_triage_page, render))
+          next_submit += 1
 
-      for p_idx in range(num_pages):
         _save_progress(
           Progress(
-            done=done_count + idx - 1,
-            total=total,
-            errors=errors,
+            done=state.done,
+            total=state.total,
+            errors=state.errors,
             current_file=display_name,
             current_page=f'{p_idx + 1}/{num_pages}',
             current_pages_total=num_pages,
             current_file_started=file_start,
-            elapsed=time.time() - pipeline_start,
-            avg_per_file=avg,
-            recent_files=recent_files,
-          )
+            elapsed=time.time() - state.pipeline_start,
+            avg_per_file=_avg_per_file(state),
+            recent_files=state.recent_files,
+          ),
+          throttle=p_idx > start,
         )
 
         page_t = time.time()
-        image, native_text = next_future.result()
-
-        if p_idx + 1 < num_pages:
-          next_future = executor.submit(_render_page, doc, p_idx + 1)
-
-        if image is not None:
-          tess_text = _tesseract_ocr(image)
-          if _tesseract_quality_ok(tess_text):
-            md = tess_text
-            tag = 'tess'
-            counts.tess += 1
-          else:
-            _load_chandra(chandra)
-            md = _chandra_ocr(chandra.model, chandra.processor, chandra.formatted_prompt, image)
-            tag = 'vlm'
-            counts.vlm += 1
-          image.close()
-        else:
-          md = native_text
-          tag = 'txt'
-          counts.txt += 1
-
-        if p_idx > 0:
-          out.write('\n\n')
-        out.write(md)
-        out.flush()
-        _log(f'  p{p_idx + 1}/{num_pages} [{tag}] {time.time() - page_t:.0f}s ({len(md)} chars)')
-
-        if p_idx % 10 == 9:  # noqa: PLR2004
-          _free_memory()
-
-    executor.shutdown(wait=False)
-
-    tmp_path.rename(md_path)
-    _free_memory()
+        _queue_page(buf, counts, p_idx, pages.popleft().result(), page_t)
+        if buf.vlm_queue and (len(buf.vlm_queue) >= VLM_BATCH_SIZE or p_idx == num_pages - 1):
+          _flush_vlm(buf, counts)
+        _write_ready(buf, out)
+
+      out.flush()
+      os.fsync(out.fileno())
+
+    tmp_path.replace(md_path)
     return num_pages  # noqa: TRY300
   except Exception:
+    for pending_page in pages:
+      pending_page.cancel()
+    for _, image, _ in buf.vlm_queue:
+      image.close()
     for p in [tmp_path, md_path]:
       if p.exists():
         p.unlink()
     raise
-  finally:
-    doc.close()
 
 
-def _run_ocr() -> None:  # noqa: PLR0914
-  with DATA_FILE.open(encoding='utf-8') as f:
+@dataclass
+class TessOnlyResult:
+  num_pages: int
+  counts: PageCounts
+  elapsed: float
+  complete: bool
+  parts: list[str] = field(default_factory=list)
+
+
+def _ocr_one_file_tess_only(pdf: str, unique_name: str) -> TessOnlyResult:
+  file_start = time.time()
+  md_path = OUTPUT_BASE / f'{unique_name}.md'
+  tmp_path = OUTPUT_BASE / f'{unique_name}.md.tmp'
+  num_pages = _page_count(pdf)
+  counts = PageCounts()
+  parts: list[str] = []
+  for p_idx in range(num_pages):
+    data, width, height, native_text = _render_page(pdf, p_idx)
+    if not data:
+      counts.txt += 1
+      parts.append(native_text)
+      continue
+    image = Image.frombuffer('L', (width, height), data, 'raw', 'L', 0, 1)
+    tess_text = _tesseract_ocr(image)
+    image.close()
+    if not _tesseract_quality_ok(tess_text):
+      return TessOnlyResult(num_pages, counts, time.time() - file_start, complete=False, parts=parts)
+    counts.tess += 1
+    parts.append(tess_text)
+  try:
+    with tmp_path.open('w', encoding='utf-8', buffering=WRITE_BUFFER) as out:
+      out.write('\n\n'.join(parts))
+      out.flush()
+      os.fsync(out.fileno())
+    tmp_path.replace(md_path)
+  except Exception:
+    tmp_path.unlink(missing_ok=True)
+    raise
+  return TessOnlyResult(num_pages, counts, time.time() - file_start, complete=True)
+
+
+COHORT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+
+@cache
+def _cohort_pool() -> ProcessPoolExecutor:
+  return ProcessPoolExecutor(max_workers=COHORT_WORKERS)
+
+
+def _reset_cohort_pool() -> None:
+  _cohort_pool().shutdown(cancel_futures=True)
+  _cohort_pool.cache_clear()
+
+
+def _submit_tess_only(job: tuple[str, str]) -> Future[TessOnlyResult]:
+  try:
+    return _cohort_pool().submit(_ocr_one_file_tess_only, *job)
+  except BrokenProcessPool:
+    _reset_cohort_pool()
+    return _cohort_pool().submit(_ocr_one_file_tess_only, *job)
+
+
+def _is_broken(future: Future[TessOnlyResult]) -> bool:
+  return future.done() and not future.cancelled() and isinstance(future.exception(), BrokenProcessPool)
+
+
+def _restart_cohort(
+  futures: dict[Future[TessOnlyResult], tuple[str, str]],
+  hybrid: deque[tuple[str, str, list[str]]],
+  struck: set[str],
+) -> None:
+  wait(futures)
+  broken = [(future, job) for future, job in futures.items() if _is_broken(future)]
+  _reset_cohort_pool()
+  for rank, (future, job) in enumerate(broken):
+    del futures[future]
+    pdf = job[0]
+    if rank < COHORT_WORKERS and pdf in struck:
+      _log(f'  {Path(pdf).stem} broke the tesseract-only pool again, queued for hybrid OCR')
+      hybrid.append((*job, []))
+      continue
+    if rank < COHORT_WORKERS:
+      struck.add(pdf)
+      _log(f'  {Path(pdf).stem} lost its tesseract-only worker, retrying on a fresh pool')
+    futures[_submit_tess_only(job)] = job
+
+
+def _harvest_tess_only(
+  state: RunState,
+  futures: dict[Future[TessOnlyResult], tuple[str, str]],
+  hybrid: deque[tuple[str, str, list[str]]],
+  struck: set[str],
+) -> None:
+  if any(map(_is_broken, futures)):
+    _restart_cohort(futures, hybrid, struck)
+  for future in [f for f in futures if f.done()]:
+    pdf, unique_name = futures.pop(future)
+    try:
+      result = future.result()
+    except Exception as ocr_err:  # noqa: BLE001
+      _record_error(state, pdf, ocr_err)
+      continue
+    state.counts.tess += result.counts.tess
+    state.counts.txt += result.counts.txt
+    if not result.complete:
+      _log(f'  {Path(pdf).stem} needs VLM at p{len(result.parts) + 1}, resuming with hybrid OCR')
+      hybrid.append((pdf, unique_name, result.parts))
+      continue
+    _record_file(state, pdf, result.num_pages, result.elapsed)
+
+
+def _run_ocr(data_file: Path) -> None:  # noqa: PLR0914
+  with data_file.open(encoding='utf-8') as f:
     data = json.load(f)
 
   files = data['files']['scanned'] + data['files']['mixed']
+  mixed = set(data['files']['mixed'])
   OUTPUT_BASE.mkdir(parents=True, exist_ok=True)
 
+  with os.scandir(OUTPUT_BASE) as entries:
+    done_stems = {e.name.removesuffix('.md') for e in entries if e.name.endswith('.md')}
+
   done_count = 0
-  pending = []
+  pending: list[tuple[str, str]] = []
   for pdf in files:
     unique_name = _to_output_name(pdf)
-    if (OUTPUT_BASE / f'{unique_name}.md').exists():
+    if unique_name in done_stems:
       done_count += 1
     else:
-      pending.append(pdf)
+      pending.append((pdf, unique_name))
 
   total = len(files)
   _log(f'Total: {total}, Already done: {done_count}, Pending: {len(pending)}')
@@ -335,77 +710,147 @@ def _run_ocr() -> None:  # noqa: PLR0914
     _save_progress(Progress(total, total, 0, '-', '-', 0, 0, 0, 0, []))
     return
 
-  chandra = ChandraState()
-  counts = PageCounts()
-  _log('Hybrid OCR: Tesseract fast-pass, chandra VLM fallback')
+  state = RunState(total, done_count, len(pending), time.time())
+  hybrid: deque[tuple[str, str, list[str]]] = deque((pdf, name, []) for pdf, name in pending if pdf not in mixed)
+  tess_only = [job for job in pending if job[0] in mixed]
+  _log(f'Hybrid OCR: Tesseract fast-pass, chandra VLM fallback ({len(tess_only)} files tried tesseract-only first)')
 
-  errors = 0
-  file_times: list[float] = []
-  recent_files: list[dict[str, object]] = []
-  pipeline_start = time.time()
+  struck: set[str] = set()
+  futures = {_submit_tess_only(job): job for job in tess_only}
+  try:
+    while hybrid or futures:
+      _harvest_tess_only(state, futures, hybrid, struck)
+      if hybrid:
+        pdf, unique_name, head = hybrid.popleft()
+        t1 = time.time()
+        try:
+          num_pages = _ocr_one_file(pdf, unique_name, state, head)
+          _record_file(state, pdf, num_pages, time.time() - t1)
+        except BrokenProcessPool as ocr_err:
+          _reset_render_pool()
+          _record_error(state, pdf, ocr_err)
+        except Exception as ocr_err:  # noqa: BLE001
+          _record_error(state, pdf, ocr_err)
+      elif futures:
+        wait(futures, return_when=FIRST_COMPLETED)
+  finally:
+    _reset_cohort_pool()
 
-  for i, pdf in enumerate(pending, 1):
-    unique_name = _to_output_name(pdf)
+  total_time = _format_duration(time.time() - state.pipeline_start)
+  _log(f'OCR complete. Done: {state.done}, Errors: {state.errors}, Time: {total_time}')
+  counts = state.counts
+  _log(f'Engine stats: tess={counts.tess} vlm={counts.vlm} txt={counts.txt}')
 
-    if (OUTPUT_BASE / f'{unique_name}.md').exists():
-      done_count += 1
-    else:
-      t1 = time.time()
-      avg = sum(file_times) / len(file_times) if file_times else 60
 
+def _job_paths() -> dict[str, str]:
+  return {
+    'data_dir': str(DATA_DIR),
+    'output_base': str(OUTPUT_BASE.resolve()),
+    'status_file': str(STATUS_FILE.resolve()),
+    'log_file': str(LOG_FILE.resolve()),
+  }
+
+
+def _foreign_job_paths(job: dict[str, str]) -> list[str]:
+  own = _job_paths()
+  return [key for key, path in own.items() if key in job and str(Path(job[key]).resolve()) != path]
+
+
+def _peer_is_owner(conn: socket.socket) -> bool:
+  so_peercred = getattr(socket, 'SO_PEERCRED', None)
+  if so_peercred is None:
+    return True
+  creds = conn.getsockopt(socket.SOL_SOCKET, so_peercred, struct.calcsize('3i'))
+  _, uid, _ = struct.unpack('3i', creds)
+  return uid == os.getuid()
+
+
+class _OcrJobHandler(socketserver.StreamRequestHandler):
+  def _reply(self, reply: dict[str, object]) -> None:
+    self.wfile.write(json.dumps(reply).encode() + b'\n')
+    self.wfile.flush()
+
+  def handle(self) -> None:
+    if not _peer_is_owner(self.request):
+      return
+    for line in self.rfile:
       try:
-        num_pages = _ocr_one_file(
-          pdf,
-          chandra,
-          counts,
-          done_count,
-          i,
-          len(pending),
-          total,
-          errors,
-          avg,
-          pipeline_start,
-          recent_files,
-        )
-        elapsed = time.time() - t1
-        file_times.append(elapsed)
-        avg = sum(file_times) / len(file_times)
-        display_name = Path(pdf).stem
-        recent_files.append({
-          'name': display_name,
-          'pages': num_pages,
-          'duration': round(elapsed, 1),
-          'per_page': round(elapsed / max(num_pages, 1), 1),
+        job = json.loads(line)
+        data_file = Path(job.get('classification', DATA_FILE)).resolve()
+        foreign = _foreign_job_paths(job)
+      except (AttributeError, TypeError, ValueError) as parse_err:
+        self._reply({'type': 'error', 'error': f'invalid job: {parse_err}'})
+        continue
+      if foreign:
+        self._reply({
+          'type': 'rejected',
+          'classification': str(data_file),
+          'error': f'daemon serves a different {", ".join(foreign)}',
         })
-        _log(f'  done {elapsed:.0f}s ({elapsed / max(num_pages, 1):.0f}s/p) avg={avg:.0f}s/file')
-        _save_progress(
-          Progress(
-            done_count + i,
-            total,
-            errors,
-            '-',
-            '-',
-            0,
-            0,
-            time.time() - pipeline_start,
-            avg,
-            recent_files,
-          )
-        )
-      except Exception as ocr_err:  # noqa: BLE001
-        errors += 1
-        _log(f'  ERROR {Path(pdf).stem}: {ocr_err}')
-        _free_memory()
-
-  total_time = _format_duration(time.time() - pipeline_start)
-  _log(f'OCR complete. Done: {done_count + len(pending)}, Errors: {errors}, Time: {total_time}')
-  _log(f'Engine stats: tess={counts.tess} vlm={counts.vlm} txt={counts.txt}')
+        continue
+      _log(f'=== Job {data_file} ===')
+      try:
+        _run_ocr(data_file)
+        reply: dict[str, object] = {'type': 'done', 'classification': str(data_file)}
+      except Exception as job_err:  # noqa: BLE001
+        _log(f'  JOB ERROR {data_file}: {job_err}')
+        reply = {'type': 'error', 'classification': str(data_file), 'error': str(job_err)}
+      self._reply(reply)
+
+
+def _serve() -> None:
+  _load_chandra(MODEL_ID)
+  SOCKET_PATH.unlink(missing_ok=True)
+  old_umask = os.umask(0o077)
+  try:
+    server = socketserver.UnixStreamServer(str(SOCKET_PATH), _OcrJobHandler)
+  finally:
+    os.umask(old_umask)
+  signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+  with server:
+    _log(f'Serving OCR jobs on {SOCKET_PATH}')
+    try:
+      server.serve_forever()
+    finally:
+      SOCKET_PATH.unlink(missing_ok=True)
+
+
+def _relay_to_daemon() -> bool:
+  with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+    try:
+      client.connect(str(SOCKET_PATH))
+    except OSError:
+      return False
+    job = {'classification': str(DATA_FILE.resolve()), **_job_paths()}
+    client.sendall(json.dumps(job).encode() + b'\n')
+    with client.makefile('r', encoding='utf-8') as replies:
+      line = replies.readline()
+  if not line:
+    msg = f'OCR daemon at {SOCKET_PATH} closed the connection'
+    raise RuntimeError(msg)
+  reply = json.loads(line)
+  if reply['type'] == 'rejected':
+    _log(f'OCR daemon rejected job ({reply["error"]}), running locally')
+    return False
+  if reply['type'] == 'error':
+    raise RuntimeError(reply['error'])
+  _log(f'OCR job completed by daemon at {SOCKET_PATH}')
+  return True
 
 
 def main() -> None:
   OUTPUT_BASE.mkdir(parents=True, exist_ok=True)
+  if '--use-daemon' in sys.argv and _relay_to_daemon():
+    return
   _log('=== Batch OCR Start (MLX) ===')
-  _run_ocr()
+  try:
+    if '--daemon' in sys.argv:
+      _serve()
+    else:
+      _run_ocr(DATA_FILE)
+  finally:
+    _OCR_POOL.shutdown(cancel_futures=True)
+    _render_pool().shutdown(cancel_futures=True)
   _log('=== OCR DONE ===')
 
 
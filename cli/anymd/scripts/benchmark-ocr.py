@@ -6,9 +6,10 @@ from pathlib import Path
 
 os.environ['PADDLE_PDX_DISABLE_MODEL_SOURCE_CHECK'] = 'True'
 
+import numpy as np
 import pypdfium2 as pdfium
 import pypdfium2.raw as pdfium_c
-from PIL import Image, ImageChops, ImageOps
+from PIL import Image
 
 CROP_PADDING = 20
 CROP_THRESHOLD = 10
@@ -18,6 +19,9 @@ DIACRITICS = frozenset(
   'àáảãạăắằẳẵặâấầẩẫậèéẻẽẹêếềểễệìíỉĩịòóỏõọôốồổỗộơớờởỡợùúủũụưứừửữựỳýỷỹỵđ'
   'ÀÁẢÃẠĂẮẰẲẴẶÂẤẦẨẪẬÈÉẺẼẸÊẾỀỂỄỆÌÍỈĨỊÒÓỎÕỌÔỐỒỔỖỘƠỚỜỞỠỢÙÚỦŨỤƯỨỪỬỮỰỲÝỶỸỴĐ'
 )
+_DIACRITICS_ARR = np.array(sorted(ord(c) for c in DIACRITICS), dtype=np.uint32)
+_BMP_SIZE = 0x10000
+_IS_ALPHA = np.array([chr(i).isalpha() for i in range(_BMP_SIZE)], dtype=np.bool_)
 
 
 def _get_arg(flag: str, default: str) -> str:
@@ -43,19 +47,15 @@ ENGINES = [e.strip() for e in ENGINES_STR.split(',')]
 
 
 def _crop_margins(img: Image.Image) -> Image.Image:
-  bg = Image.new('RGB', img.size, (255, 255, 255))
-  diff = ImageChops.difference(img, bg)
-  gray = ImageOps.grayscale(diff)
-  bbox = gray.point(lambda x: 255 if x > CROP_THRESHOLD else 0).getbbox()
-  bg.close()
-  diff.close()
-  gray.close()
-  if not bbox:
+  mask = np.asarray(img).min(axis=2) < 255 - CROP_THRESHOLD
+  cols = mask.any(axis=0)
+  if not cols.any():
     return img
-  x0 = max(0, bbox[0] - CROP_PADDING)
-  y0 = max(0, bbox[1] - CROP_PADDING)
-  x1 = min(img.size[0], bbox[2] + CROP_PADDING)
-  y1 = min(img.size[1], bbox[3] + CROP_PADDING)
+  rows = mask.any(axis=1)
+  x0 = max(0, int(np.argmax(cols)) - CROP_PADDING)
+  y0 = max(0, int(np.argmax(rows)) - CROP_PADDING)
+  x1 = min(img.size[0], len(cols) - int(np.argmax(cols[::-1])) + CROP_PADDING)
+  y1 = min(img.size[1], len(rows) - int(np.argmax(rows[::-1])) + CROP_PADDING)
   return img.crop((x0, y0, x1, y1))
 
 
@@ -69,14 +69,23 @@ def render_page(doc: pdfium.PdfDocument, page_idx: int) -> Image.Image:
   return _crop_margins(pil_image)
 
 
-def _count_vietnamese_diacritics(text: str) -> int:
-  count = 0
-  for ch in text:
-    if ch in DIACRITICS:
-      count += 1
+def _codepoints(text: str) -> np.ndarray:
+  return np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+
+
+def _count_alpha(text: str) -> int:
+  codes = _codepoints(text)
+  bmp = codes < _BMP_SIZE
+  count = int(np.count_nonzero(_IS_ALPHA[codes[bmp]]))
+  if not bmp.all():
+    count += sum(chr(c).isalpha() for c in codes[~bmp].tolist())
   return count
 
 
+def _count_vietnamese_diacritics(text: str) -> int:
+  return int(np.count_nonzero(np.isin(_codepoints(text), _DIACRITICS_ARR)))
+
+
 def run_tesseract(image: Image.Image, _state: dict) -> str:
   import pytesseract  # noqa: PLC0415
 
@@ -84,8 +93,6 @@ def run_tesseract(image: Image.Image, _state: dict) -> str:
 
 
 def run_paddleocr(image: Image.Image, _state: dict) -> str:
-  import numpy as np  # noqa: PLC0415
-
   if 'engine' not in _state:
     from paddleocr import PaddleOCR  # noqa: PLC0415
 
@@ -102,8 +109,6 @@ def run_paddleocr(image: Image.Image, _state: dict) -> str:
 
 
 def run_easyocr(image: Image.Image, _state: dict) -> str:
-  import numpy as np  # noqa: PLC0415
-
   if 'reader' not in _state:
     import easyocr  # noqa: PLC0415
 
@@ -200,7 +205,7 @@ def main() -> None:  # noqa: C901, PLR0912, PLR0914, PLR0915
         text = runner(img, states[engine_name])
         elapsed = time.time() - t0
         char_count = len(text)
-        alpha_count = sum(1 for c in text if c.isalpha())
+        alpha_count = _count_alpha(text)
         diacritics_count = _count_vietnamese_diacritics(text)
         print(f'{elapsed:.1f}s | {char_count} chars | {alpha_count} alpha | {diacritics_count} diacritics')
 
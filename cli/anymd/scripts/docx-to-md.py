@@ -12,6 +12,14 @@ def _emit(data: dict[str, object]) -> None:
   print(json.dumps(data), flush=True)
 
 
+def _emit_converted(index: int, total: int, file: str, seconds: float, chars: int) -> None:
+  print(
+    f'{{"type": "converted", "index": {index}, "total": {total}, "file": {json.dumps(file)}, '
+    f'"seconds": {seconds}, "chars": {chars}}}',
+    flush=True,
+  )
+
+
 def _convert_one(converter: MarkItDown, input_path: str, out_path: str, index: int, total: int) -> None:
   t1 = time.time()
   try:
@@ -19,14 +27,7 @@ def _convert_one(converter: MarkItDown, input_path: str, out_path: str, index: i
     md = result.text_content
     Path(out_path).parent.mkdir(parents=True, exist_ok=True)
     Path(out_path).write_text(md, encoding='utf-8')
-    _emit({
-      'type': 'converted',
-      'index': index,
-      'total': total,
-      'file': Path(input_path).name,
-      'seconds': round(time.time() - t1, 1),
-      'chars': len(md),
-    })
+    _emit_converted(index, total, Path(input_path).name, round(time.time() - t1, 1), len(md))
   except Exception as exc:  # noqa: BLE001
     _emit({
       'type': 'error',
@@ -1,6 +1,17 @@
 import json
+import os
+import signal
+import socket
+import socketserver
+import struct
 import sys
+import tempfile
 import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import redirect_stdout
+from dataclasses import asdict, dataclass
+from functools import cache
 from pathlib import Path
 
 from marker.converters.pdf import PdfConverter
@@ -10,6 +21,18 @@ from markitdown import MarkItDown
 
 MIN_ARGS = 2
 MIN_FALLBACK_CHARS = 10
+WRITE_QUEUE_DEPTH = 2
+
+
+def _get_arg(flag: str, default: str) -> str:
+  try:
+    idx = sys.argv.index(flag)
+    return sys.argv[idx + 1]
+  except (ValueError, IndexError):
+    return default
+
+
+SOCKET_PATH = Path(_get_arg('--socket', str(Path(tempfile.gettempdir()) / f'anymd-marker-{os.getuid()}.sock')))
 
 _mid = MarkItDown()
 
@@ -18,6 +41,31 @@ def _emit(data: dict[str, object]) -> None:
   print(json.dumps(data), flush=True)
 
 
+def _emit_converted(index: int, total: int, file: str, seconds: float, chars: int) -> None:
+  print(
+    f'{{"type": "converted", "index": {index}, "total": {total}, "file": {json.dumps(file)}, '
+    f'"seconds": {seconds}, "chars": {chars}}}',
+    flush=True,
+  )
+
+
+@cache
+def _get_converter() -> PdfConverter:
+  return PdfConverter(artifact_dict=create_model_dict())
+
+
+def _write_atomic(out_path: str, md: str) -> None:
+  path = Path(out_path)
+  path.parent.mkdir(parents=True, exist_ok=True)
+  tmp_path = path.with_name(f'{path.name}.tmp')
+  try:
+    tmp_path.write_text(md, encoding='utf-8')
+    tmp_path.replace(path)
+  except Exception:
+    tmp_path.unlink(missing_ok=True)
+    raise
+
+
 def _markitdown_fallback(pdf_path: str) -> str | None:
   try:
     result = _mid.convert(pdf_path)
@@ -30,68 +78,151 @@ def _markitdown_fallback(pdf_path: str) -> str | None:
     return text
 
 
-def _convert_one(converter: PdfConverter, pdf_path: str, out_path: str, index: int, total: int) -> None:
+@dataclass(frozen=True)
+class FileEvent:
+  index: int
+  total: int
+  file: str
+  seconds: float
+
+
+def _write_and_emit(out_path: str, md: str, event: FileEvent) -> None:
+  try:
+    _write_atomic(out_path, md)
+  except Exception as write_exc:  # noqa: BLE001
+    _emit({'type': 'error', **asdict(event), 'error': str(write_exc)})
+  else:
+    _emit_converted(event.index, event.total, event.file, event.seconds, len(md))
+
+
+def _convert_one(
+  converter: PdfConverter, writer: ThreadPoolExecutor, entry: dict[str, str], index: int, total: int
+) -> Future[None]:
   t1 = time.time()
+  pdf_path = entry['input']
   try:
     rendered = converter(pdf_path)
     md, _, _ = text_from_rendered(rendered)
-    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    Path(out_path).write_text(md, encoding='utf-8')
-    _emit({
-      'type': 'converted',
-      'index': index,
-      'total': total,
-      'file': Path(pdf_path).name,
-      'seconds': round(time.time() - t1, 1),
-      'chars': len(md),
-    })
   except Exception as marker_exc:  # noqa: BLE001
     fallback_md = _markitdown_fallback(pdf_path)
-    if fallback_md:
-      Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-      Path(out_path).write_text(fallback_md, encoding='utf-8')
-      _emit({
-        'type': 'converted',
-        'index': index,
-        'total': total,
-        'file': Path(pdf_path).name,
-        'seconds': round(time.time() - t1, 1),
-        'chars': len(fallback_md),
-      })
-    else:
-      _emit({
-        'type': 'error',
-        'index': index,
-        'total': total,
-        'file': Path(pdf_path).name,
-        'seconds': round(time.time() - t1, 1),
-        'error': str(marker_exc),
-      })
-
-
-def main() -> None:
-  if len(sys.argv) < MIN_ARGS:
-    print('Usage: pdf-to-md.py <manifest.json>', file=sys.stderr)
-    sys.exit(1)
-
-  manifest_path = sys.argv[1]
-  manifest: list[dict[str, str]] = json.loads(Path(manifest_path).read_text('utf-8'))
-
+    if not fallback_md:
+      return writer.submit(
+        _emit,
+        {
+          'type': 'error',
+          'index': index,
+          'total': total,
+          'file': Path(pdf_path).name,
+          'seconds': round(time.time() - t1, 1),
+          'error': str(marker_exc),
+        },
+      )
+    md = fallback_md
+  event = FileEvent(index, total, Path(pdf_path).name, round(time.time() - t1, 1))
+  return writer.submit(_write_and_emit, entry['output'], md, event)
+
+
+def _load_manifest(manifest_path: str) -> list[dict[str, str]]:
+  return json.loads(Path(manifest_path).read_text('utf-8'))
+
+
+def _run_manifest(manifest: list[dict[str, str]]) -> None:
   if not manifest:
     _emit({'type': 'done', 'total': 0})
     return
 
   t0 = time.time()
   _emit({'type': 'loading'})
-  converter = PdfConverter(artifact_dict=create_model_dict())
+  converter = _get_converter()
   _emit({'type': 'loaded', 'seconds': round(time.time() - t0, 1)})
 
   total = len(manifest)
-  for i, entry in enumerate(manifest):
-    _convert_one(converter, entry['input'], entry['output'], i, total)
+  writes: deque[Future[None]] = deque()
+  with ThreadPoolExecutor(max_workers=1) as writer:
+    for i, entry in enumerate(manifest):
+      writes.append(_convert_one(converter, writer, entry, i, total))
+      while len(writes) > WRITE_QUEUE_DEPTH:
+        writes.popleft().result()
+    while writes:
+      writes.popleft().result()
 
   _emit({'type': 'done', 'total': total})
 
 
+def _peer_is_owner(conn: socket.socket) -> bool:
+  so_peercred = getattr(socket, 'SO_PEERCRED', None)
+  if so_peercred is None:
+    return True
+  creds = conn.getsockopt(socket.SOL_SOCKET, so_peercred, struct.calcsize('3i'))
+  _, uid, _ = struct.unpack('3i', creds)
+  return uid == os.getuid()
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+  def handle(self) -> None:
+    if not _peer_is_owner(self.request):
+      return
+    out = self.request.makefile('w', encoding='utf-8')
+    try:
+      with redirect_stdout(out):
+        try:
+          _run_manifest(json.loads(self.rfile.readline())['entries'])
+        except Exception as job_exc:  # noqa: BLE001
+          _emit({'type': 'error', 'error': str(job_exc)})
+    finally:
+      out.close()
+
+
+def _serve() -> None:
+  t0 = time.time()
+  _emit({'type': 'loading'})
+  _get_converter()
+  _emit({'type': 'loaded', 'seconds': round(time.time() - t0, 1)})
+  SOCKET_PATH.unlink(missing_ok=True)
+  old_umask = os.umask(0o077)
+  try:
+    server = socketserver.UnixStreamServer(str(SOCKET_PATH), _JobHandler)
+  finally:
+    os.umask(old_umask)
+  signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+  with server:
+    _emit({'type': 'listening', 'socket': str(SOCKET_PATH)})
+    try:
+      server.serve_forever()
+    finally:
+      SOCKET_PATH.unlink(missing_ok=True)
+
+
+def _relay_to_daemon(manifest_path: str) -> bool:
+  with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+    try:
+      client.connect(str(SOCKET_PATH))
+    except OSError:
+      return False
+    entries = [
+      {'input': str(Path(e['input']).resolve()), 'output': str(Path(e['output']).resolve())}
+      for e in _load_manifest(manifest_path)
+    ]
+    client.sendall(json.dumps({'entries': entries}).encode() + b'\n')
+    with client.makefile('r', encoding='utf-8') as replies:
+      for line in replies:
+        print(line, end='', flush=True)
+  return True
+
+
+def main() -> None:
+  if len(sys.argv) < MIN_ARGS:
+    print('Usage: pdf-to-md.py <manifest.json> [--use-daemon] | --daemon [--socket <path>]', file=sys.stderr)
+    sys.exit(1)
+
+  if sys.argv[1] == '--daemon':
+    _serve()
+    return
+
+  manifest_path = sys.argv[1]
+  if '--use-daemon' not in sys.argv or not _relay_to_daemon(manifest_path):
+    _run_manifest(_load_manifest(manifest_path))
+
+
 if __name__ == '__main__':
   main()